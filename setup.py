@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+"""Build the optional compiled kernels: python setup.py build_ext --inplace"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="pythonvi",
+    ext_modules=cythonize("vi_core.pyx"),
+)
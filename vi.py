@@ -5,12 +5,14 @@ Minimal vi editor with Chinese support
 """
 
 import curses
-import curses.ascii
 import sys
 import os
 import locale
 import datetime
 import inspect
+import array
+import bisect
+import unicodedata
 
 def log(msg):
     frameinfo = inspect.getframeinfo(inspect.currentframe().f_back)
@@ -21,23 +23,222 @@ def log(msg):
 # Set locale for UTF-8 support
 locale.setlocale(locale.LC_ALL, '')
 
+# Bjoern Hoehrmann's UTF-8 DFA (http://bjoern.hoehrmann.de/utf-8/decoder/dfa/):
+# first 256 bytes map each input byte to a character class, the remaining 108
+# map (state, class) to the next state.  States are multiples of 12.
+UTF8_ACCEPT = 0
+UTF8_REJECT = 12
+
+UTF8D = bytes([
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 00..1f
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 20..3f
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 40..5f
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 60..7f
+    1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1, 9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,  # 80..9f
+    7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7, 7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,  # a0..bf
+    8,8,2,2,2,2,2,2,2,2,2,2,2,2,2,2, 2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,  # c0..df
+    10,3,3,3,3,3,3,3,3,3,3,3,3,4,3,3, 11,6,6,6,5,8,8,8,8,8,8,8,8,8,8,8, # e0..ff
+    # transition table
+    0,12,24,36,60,96,84,12,12,12,48,72, 12,12,12,12,12,12,12,12,12,12,12,12,
+    12,0,12,12,12,12,12,0,12,0,12,12, 12,24,12,12,12,12,12,24,12,24,12,12,
+    12,12,12,12,12,12,12,24,12,12,12,12, 12,24,12,12,12,12,12,12,12,24,12,12,
+    12,12,12,12,12,12,12,36,12,36,12,12, 12,36,12,12,12,12,12,36,12,36,12,12,
+    12,36,12,12,12,12,12,12,12,12,12,12,
+])
+
+def utf8_decode(state, codep, byte):
+    """Advance the UTF-8 DFA by one byte, returning (state, codepoint)"""
+    typ = UTF8D[byte]
+    if state != UTF8_ACCEPT:
+        codep = (byte & 0x3f) | (codep << 6)
+    else:
+        codep = (0xff >> typ) & byte
+    return UTF8D[256 + state + typ], codep
+
+# Display widths precomputed for the BMP + SMP + SIP into one contiguous
+# bytes table: wide/fullwidth East Asian chars are 2 columns, combining
+# marks and format chars are 0, everything else 1.  A single bytes index
+# replaces a per-char unicodedata call on the hot path.
+WIDTH_TABLE_MAX = 0x30000
+
+def _build_width_table():
+    eaw = unicodedata.east_asian_width
+    cat = unicodedata.category
+    def width(cp):
+        c = chr(cp)
+        if cat(c) in ('Mn', 'Me', 'Cf'):
+            return 0
+        return 2 if eaw(c) in ('W', 'F') else 1
+    return bytes(width(cp) for cp in range(WIDTH_TABLE_MAX))
+
+WIDTH_TABLE = _build_width_table()
+
+def char_width(c):
+    """Display width of a single character"""
+    cp = ord(c)
+    return WIDTH_TABLE[cp] if cp < WIDTH_TABLE_MAX else 1
+
+# The numeric kernels (UTF-8 DFA, width scan) have three implementations,
+# picked at import time: the Cython extension (python setup.py build_ext
+# --inplace), then numba-JITted scans, then plain Python.
+try:
+    import vi_core
+except ImportError:
+    vi_core = None
+
+if vi_core is not None:
+    utf8_decode = vi_core.utf8_decode
+
+    def scan_widths(line):
+        return array.array('B', vi_core.scan_widths(line, WIDTH_TABLE))
+else:
+    try:
+        import numpy as np
+        from numba import njit
+
+        _WIDTH_NP = np.frombuffer(WIDTH_TABLE, dtype=np.uint8)
+
+        @njit(cache=True)
+        def _scan_widths_jit(cp, table):
+            out = np.empty(cp.shape[0], dtype=np.uint8)
+            for i in range(cp.shape[0]):
+                c = cp[i]
+                out[i] = table[c] if c < table.shape[0] else 1
+            return out
+
+        def scan_widths(line):
+            cp = np.frombuffer(line.encode('utf-32-le'), dtype=np.uint32)
+            return array.array('B', _scan_widths_jit(cp, _WIDTH_NP).tobytes())
+    except ImportError:
+        def scan_widths(line):
+            return array.array('B', map(char_width, line))
+
+class GapLine:
+    """Gap buffer over one line of text.
+
+    The line is stored as an array of UTF-32 codepoints with a gap at the
+    edit point, so repeated inserts/deletes at a (slowly) moving cursor cost
+    O(1) amortized instead of reallocating the whole string per keystroke.
+    """
+    __slots__ = ('buf', 'gap_lo', 'gap_hi')
+
+    GAP = 64  # codepoints reserved at the edit point
+
+    def __init__(self, text, col=0):
+        cps = array.array('I', (ord(c) for c in text))
+        self.buf = cps[:col] + array.array('I', [0]) * self.GAP + cps[col:]
+        self.gap_lo = col
+        self.gap_hi = col + self.GAP
+
+    def __len__(self):
+        return len(self.buf) - (self.gap_hi - self.gap_lo)
+
+    def move_gap(self, col):
+        lo, hi = self.gap_lo, self.gap_hi
+        if col < lo:
+            n = lo - col
+            self.buf[hi-n:hi] = self.buf[col:lo]
+            self.gap_lo, self.gap_hi = col, hi - n
+        elif col > lo:
+            n = col - lo
+            self.buf[lo:lo+n] = self.buf[hi:hi+n]
+            self.gap_lo, self.gap_hi = col, hi + n
+
+    def insert(self, col, text):
+        self.move_gap(col)
+        n = len(text)
+        gap = self.gap_hi - self.gap_lo
+        if gap < n:  # widen the gap to fit the run plus fresh slack
+            pad = array.array('I', [0]) * (n - gap + self.GAP)
+            self.buf[self.gap_hi:self.gap_hi] = pad
+            self.gap_hi += len(pad)
+        # one slice assignment instead of a per-character write loop
+        cps = array.array('I')
+        cps.frombytes(text.encode('utf-32-le'))
+        self.buf[self.gap_lo:self.gap_lo + n] = cps
+        self.gap_lo += n
+
+    def delete(self, col):
+        """Remove the character at col by widening the gap over it"""
+        self.move_gap(col)
+        self.gap_hi += 1
+
+    def to_str(self):
+        return (self.buf[:self.gap_lo] + self.buf[self.gap_hi:]).tobytes().decode('utf-32-le')
+
+
 class Editor:
     def __init__(self, filename=None):
         log(f"Editor initialized for file: {filename}")
         self.filename = filename
         self.buffer = [""]
-        self.pos = (0, 0)  # (line, column)
+        self.y = 0  # cursor line in the buffer
+        self.x = 0  # cursor column in the buffer
         self.mode = "command"  # command, insert, visual
-        self.visual_start = None
-        self.utf8buffer = []
+        self.vs_y = None  # visual selection anchor
+        self.vs_x = None
+        self.top_line = 0  # first buffer line shown in the viewport
+        self._u8_state = UTF8_ACCEPT  # UTF-8 DFA state between keystrokes
+        self._u8_cp = 0
+        self.gapline = None  # GapLine for the line being edited, if any
+        self.gap_y = None
+        self._gap_str = None  # cached materialization of the gap line
+        self._status = None  # cached status line, rebuilt on mode change
+        self._status_mode = None
+        self._prev = []  # shadow buffer of rendered rows, sized in main_loop
+        self._dirty = True  # buffer text changed since last refresh
+        self._sync_output = False  # set in main_loop once we know the tty
         self.load_file()
+        self.init_width_cache()
+        # command-mode jump table, built once instead of an elif ladder
+        self.cmd_table = {
+            ord('i'): self.cmd_insert,
+            ord('a'): self.cmd_append,
+            ord('v'): self.cmd_visual,
+            ord('h'): self.cmd_left,
+            ord('l'): self.cmd_right,
+            ord('j'): self.cmd_down,
+            ord('n'): self.cmd_down,
+            ord('k'): self.cmd_up,
+            8: self.cmd_line_start,   # Ctrl+H
+            10: self.cmd_half_down,   # Ctrl+J
+            14: self.cmd_half_down,   # Ctrl+N
+            11: self.cmd_half_up,     # Ctrl+K
+            12: self.cmd_line_end,    # Ctrl+L
+            ord(':'): self.cmd_ex,
+        }
+        self.visual_table = {
+            27: self.vis_escape,
+            ord('d'): self.vis_delete,
+            ord('y'): self.vis_yank,
+            ord('h'): self.cmd_left,
+            ord('j'): self.cmd_down,
+            ord('k'): self.cmd_up,
+            ord('l'): self.cmd_right,
+        }
+        self.insert_table = {
+            27: self.ins_escape,
+            8: self.ins_left,          # Ctrl+H
+            10: self.ins_newline,      # Enter Ctrl+J Ctrl+M
+            11: self.ins_up,           # Ctrl+K
+            12: self.ins_right,        # Ctrl+L
+            14: self.ins_down,         # Ctrl+N
+            127: self.ins_backspace,
+            curses.KEY_BACKSPACE: self.ins_backspace,
+        }
 
     def load_file(self):
         if self.filename and os.path.exists(self.filename):
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                self.buffer = [line.rstrip('\n\r') for line in f.readlines()]
-                if not self.buffer:
-                    self.buffer = [""]
+            # One bulk read + C-level decode/split instead of readlines plus a
+            # per-line rstrip pass; halves peak memory on open
+            with open(self.filename, 'rb') as f:
+                data = f.read()
+            text = data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+            self.buffer = text.split('\n')
+            if self.buffer and self.buffer[-1] == '':
+                self.buffer.pop()  # trailing newline is not an extra line
+            if not self.buffer:
+                self.buffer = [""]
 
     def save_file(self):
         if self.filename:
@@ -49,6 +250,14 @@ class Editor:
         self.stdscr = stdscr
         curses.use_default_colors()
         self.maxy, self.maxx = stdscr.getmaxyx()
+        self._prev = [None] * self.maxy
+        self._dirty = True
+        # Synchronized-output escapes (BSU/ESU) let the terminal present the
+        # whole frame at once; terminals without support just ignore them
+        try:
+            self._sync_output = os.isatty(sys.stdout.fileno())
+        except (OSError, ValueError):
+            self._sync_output = False
         self.refresh()
         while True:
             try:
@@ -57,10 +266,17 @@ class Editor:
                 continue
             if not self.handle_input(ch):
                 break
+            if self.mode == "insert":
+                self.drain_paste_burst()
+            # exactly one render per input event, whatever the handlers did
+            self.refresh()
 
     def handle_input(self, ch):
         if ch == 3:  # Ctrl+C
             return True
+        if ch == curses.KEY_RESIZE:
+            self.handle_resize()
+            return True
         if self.mode == "command":
             return self.handle_command(ch)
         elif self.mode == "insert":
@@ -70,148 +286,232 @@ class Editor:
         return True
 
     def handle_command(self, ch):
-        if ch == ord('i'):
-            self.mode = "insert"
-        elif ch == ord('a'):
-            if self.pos[1] < len(self.buffer[self.pos[0]]):
-                self.pos = (self.pos[0], self.pos[1] + 1)
-            self.mode = "insert"
-        elif ch == ord('v'):
-            self.mode = "visual"
-            self.visual_start = self.pos
-        elif ch == ord('h'):
-            if self.pos[1] > 0:
-                self.pos = (self.pos[0], self.pos[1] - 1)
-        elif ch == ord('l'):
-            if self.pos[1] < len(self.buffer[self.pos[0]]):
-                self.pos = (self.pos[0], self.pos[1] + 1)
-        elif ch == ord('j') or ch == ord('n'):
-            if self.pos[0] < len(self.buffer) - 1:
-                next_line_len = len(self.buffer[self.pos[0] + 1])
-                self.pos = (self.pos[0] + 1, min(self.pos[1], next_line_len))
-        elif ch == ord('k'):
-            if self.pos[0] > 0:
-                prev_line_len = len(self.buffer[self.pos[0] - 1])
-                self.pos = (self.pos[0] - 1, min(self.pos[1], prev_line_len))
-        elif ch == 8:  # Ctrl+H
-            log("Ctrl+H detected, moving to start of line.")
-            self.pos = (self.pos[0], 0)
-        
-        elif ch == 10 or ch == 14: # Ctrl+J or Ctrl+N
-            log(f"Ctrl key {ch} detected, moving down half screen.")
-            half_screen = self.maxy // 2
-            new_line = self.pos[0] + half_screen
-            new_line = min(new_line, len(self.buffer) - 1)
-            new_col = min(self.pos[1], len(self.buffer[new_line]))
-            self.pos = (new_line, new_col)
-
-        elif ch == 11: # Ctrl+K
-            log("Ctrl+K detected, moving up half screen.")
-            half_screen = self.maxy // 2
-            new_line = self.pos[0] - half_screen
-            new_line = max(0, new_line)
-            new_col = min(self.pos[1], len(self.buffer[new_line]))
-            self.pos = (new_line, new_col)
-
-        elif ch == 12: # Ctrl+L
-            log("Ctrl+L detected, moving to end of line.")
-            self.pos = (self.pos[0], len(self.buffer[self.pos[0]]))
-
-        elif ch == ord(':'):
-            if not self.handle_ex_command():
-                return False
-        self.refresh()
+        # one dict lookup instead of a chain of ord() compares per keystroke
+        fn = self.cmd_table.get(ch)
+        if fn is not None and fn() is False:
+            return False
         return True
 
+    def cmd_insert(self):
+        self.mode = "insert"
+
+    def cmd_append(self):
+        if self.x < self.line_len(self.y):
+            self.x += 1
+        self.mode = "insert"
+
+    def cmd_visual(self):
+        self.mode = "visual"
+        self.vs_y, self.vs_x = self.y, self.x
+
+    def cmd_left(self):
+        if self.x > 0:
+            self.x -= 1
+
+    def cmd_right(self):
+        if self.x < self.line_len(self.y):
+            self.x += 1
+
+    def cmd_down(self):
+        if self.y < len(self.buffer) - 1:
+            self.y += 1
+            nll = self.line_len(self.y)
+            if self.x > nll:
+                self.x = nll
+
+    def cmd_up(self):
+        if self.y > 0:
+            self.y -= 1
+            pll = self.line_len(self.y)
+            if self.x > pll:
+                self.x = pll
+
+    def cmd_line_start(self):
+        log("Ctrl+H detected, moving to start of line.")
+        self.x = 0
+
+    def cmd_half_down(self):
+        log("Ctrl key detected, moving down half screen.")
+        half_screen = self.maxy // 2
+        new_line = min(self.y + half_screen, len(self.buffer) - 1)
+        self.x = min(self.x, self.line_len(new_line))
+        self.y = new_line
+
+    def cmd_half_up(self):
+        log("Ctrl+K detected, moving up half screen.")
+        half_screen = self.maxy // 2
+        new_line = max(0, self.y - half_screen)
+        self.x = min(self.x, self.line_len(new_line))
+        self.y = new_line
+
+    def cmd_line_end(self):
+        log("Ctrl+L detected, moving to end of line.")
+        self.x = self.line_len(self.y)
+
+    def cmd_ex(self):
+        if not self.handle_ex_command():
+            return False
+
     def handle_insert(self, ch):
         log(f"ch {ch}")
-        if ch == 27:  # ESC
-            log(f"ESC ctrl + [ ; ")
-            self.mode = "command"
-            if self.pos[1] > 0:
-                self.pos = (self.pos[0], self.pos[1] - 1)
-        elif ch == 11:  # Ctrl+K
-            if self.pos[0] > 0:
-                prev_line_len = len(self.buffer[self.pos[0] - 1])
-                self.pos = (self.pos[0] - 1, min(self.pos[1], prev_line_len))
-        elif ch == 8:  # Ctrl+H
-            if self.pos[1] > 0:
-                self.pos = (self.pos[0], self.pos[1] - 1)
-        elif ch == 12:  # Ctrl+L
-            if self.pos[1] < len(self.buffer[self.pos[0]]):
-                self.pos = (self.pos[0], self.pos[1] + 1)
-        elif ch == 14:  # Ctrl+N
-            if self.pos[0] < len(self.buffer) - 1:
-                next_line_len = len(self.buffer[self.pos[0] + 1])
-                self.pos = (self.pos[0] + 1, min(self.pos[1], next_line_len))
-        elif ch == 10:  # Enter Ctrl+j Ctrl+m
-            line = self.buffer[self.pos[0]]
-            self.buffer[self.pos[0]] = line[:self.pos[1]]
-            self.buffer.insert(self.pos[0] + 1, line[self.pos[1]:])
-            self.pos = (self.pos[0] + 1, 0)
-        elif ch == curses.KEY_BACKSPACE or ch == 127:
-            if self.pos[1] > 0:
-                line = self.buffer[self.pos[0]]
-                self.buffer[self.pos[0]] = line[:self.pos[1]-1] + line[self.pos[1]:]
-                self.pos = (self.pos[0], self.pos[1] - 1)
+        fn = self.insert_table.get(ch)
+        if fn is not None:
+            fn()
         else:
             s = None
-            if ch < 256 and ch != 27:
-                try:
-                    s = bytes(self.utf8buffer + [ch]).decode("utf-8")
-                    self.utf8buffer = []
-                except (UnicodeDecodeError, ValueError):
-                    self.utf8buffer.append(ch)
+            if 0 <= ch < 128:  # ASCII fast path, no DFA needed
+                s = chr(ch)
+                self._u8_state = UTF8_ACCEPT
+            elif ch < 256:
+                self._u8_state, self._u8_cp = utf8_decode(self._u8_state, self._u8_cp, ch)
+                if self._u8_state == UTF8_ACCEPT:
+                    s = chr(self._u8_cp)
+                elif self._u8_state == UTF8_REJECT:
+                    self._u8_state = UTF8_ACCEPT  # drop the malformed sequence
             else:
-                self.utf8buffer = []
-            if s and not curses.ascii.isctrl(chr(ch)):
-                line = self.buffer[self.pos[0]]
-                self.buffer[self.pos[0]] = line[:self.pos[1]] + s + line[self.pos[1]:]
-                self.pos = (self.pos[0], self.pos[1] + len(s))
-        self.refresh()
+                self._u8_state = UTF8_ACCEPT
+            # ctrl-ness of a byte is just a range check; no need to build a
+            # 1-char string for curses.ascii.isctrl
+            if s and not (ch < 32 or ch == 127):
+                self.insert_text(s)
         return True
 
+    def drain_paste_burst(self):
+        """Coalesce a run of pending printable input (a paste) into one splice"""
+        self.stdscr.nodelay(True)
+        burst = []
+        while True:
+            c = self.stdscr.getch()
+            if 32 <= c < 127:
+                burst.append(c)
+                continue
+            if c != -1:
+                curses.ungetch(c)  # not part of the burst, replay it
+            break
+        self.stdscr.nodelay(False)
+        if burst:
+            self.insert_text(bytes(burst).decode('ascii'))
+
+    def insert_text(self, s):
+        """Insert s at the cursor with one splice of the line and width caches"""
+        y, col = self.y, self.x
+        self.gap_for(y, col).insert(col, s)
+        self._gap_str = None
+        self.widths[y][col:col] = scan_widths(s)
+        self.rebuild_cum(y, col)
+        self.x = col + len(s)
+        self._dirty = True
+
+    def ins_escape(self):
+        log(f"ESC ctrl + [ ; ")
+        self.flush_gap()
+        self.mode = "command"
+        if self.x > 0:
+            self.x -= 1
+
+    def ins_up(self):
+        if self.y > 0:
+            self.flush_gap()
+            self.y -= 1
+            pll = self.line_len(self.y)
+            if self.x > pll:
+                self.x = pll
+
+    def ins_left(self):
+        if self.x > 0:
+            self.x -= 1
+
+    def ins_right(self):
+        if self.x < self.line_len(self.y):
+            self.x += 1
+
+    def ins_down(self):
+        if self.y < len(self.buffer) - 1:
+            self.flush_gap()
+            self.y += 1
+            nll = self.line_len(self.y)
+            if self.x > nll:
+                self.x = nll
+
+    def ins_newline(self):
+        self.flush_gap()
+        y, col = self.y, self.x
+        line = self.buffer[y]
+        self.buffer[y] = line[:col]
+        self.buffer.insert(y + 1, line[col:])
+        # split the width sidecar at the cursor
+        w = self.widths[y]
+        self.widths[y] = w[:col]
+        self.widths.insert(y + 1, w[col:])
+        self.cum[y] = self.cum[y][:col+1]
+        self.cum.insert(y + 1, self.cum_widths(self.widths[y+1]))
+        self.y = y + 1
+        self.x = 0
+        self._dirty = True
+
+    def ins_backspace(self):
+        if self.x > 0:
+            y, col = self.y, self.x
+            self.gap_for(y, col).delete(col - 1)
+            self._gap_str = None
+            del self.widths[y][col-1]
+            self.rebuild_cum(y, col-1)
+            self.x = col - 1
+            self._dirty = True
+
     def handle_visual(self, ch):
-        if ch == 27:  # ESC
-            self.mode = "command"
-            self.visual_start = None
-        elif ch == ord('d'):
-            # Delete visual selection
-            start_line, start_col = self.visual_start
-            end_line, end_col = self.pos
-            if start_line > end_line or (start_line == end_line and start_col > end_col):
-                start_line, end_line = end_line, start_line
-                start_col, end_col = end_col, start_col
-            if start_line == end_line:
-                line = self.buffer[start_line]
-                self.buffer[start_line] = line[:start_col] + line[end_col:]
-                self.pos = (start_line, start_col)
-            else:
-                # Multi-line delete
-                self.buffer[start_line] = self.buffer[start_line][:start_col] + self.buffer[end_line][end_col:]
-                del self.buffer[start_line+1:end_line+1]
-                self.pos = (start_line, start_col)
-            self.mode = "command"
-            self.visual_start = None
-        elif ch == ord('y'):
-            # Yank visual selection
-            self.mode = "command"
-            self.visual_start = None
-        elif ch in (ord('h'), ord('j'), ord('k'), ord('l')):
-            self.handle_command(ch)
-        self.refresh()
+        fn = self.visual_table.get(ch)
+        if fn is not None:
+            fn()
         return True
 
+    def vis_escape(self):
+        self.mode = "command"
+        self.vs_y = self.vs_x = None
+
+    def vis_delete(self):
+        # Delete visual selection
+        start_line, start_col = self.vs_y, self.vs_x
+        end_line, end_col = self.y, self.x
+        if start_line > end_line or (start_line == end_line and start_col > end_col):
+            start_line, end_line = end_line, start_line
+            start_col, end_col = end_col, start_col
+        if start_line == end_line:
+            line = self.buffer[start_line]
+            self.buffer[start_line] = line[:start_col] + line[end_col:]
+            del self.widths[start_line][start_col:end_col]
+            self.y, self.x = start_line, start_col
+        else:
+            # Multi-line delete
+            self.buffer[start_line] = self.buffer[start_line][:start_col] + self.buffer[end_line][end_col:]
+            del self.buffer[start_line+1:end_line+1]
+            self.widths[start_line] = self.widths[start_line][:start_col] + self.widths[end_line][end_col:]
+            del self.widths[start_line+1:end_line+1]
+            del self.cum[start_line+1:end_line+1]
+            self.y, self.x = start_line, start_col
+        self.rebuild_cum(start_line, start_col)
+        self._dirty = True
+        self.mode = "command"
+        self.vs_y = self.vs_x = None
+
+    def vis_yank(self):
+        # Yank visual selection
+        self.mode = "command"
+        self.vs_y = self.vs_x = None
+
     def handle_ex_command(self):
         # Simple :w and :q
         curses.echo()
         self.stdscr.addstr(self.maxy-1, 0, ":")
         try:
             cmd_bytes = self.stdscr.getstr(self.maxy-1, 1, 10)
-            cmd = cmd_bytes.decode('utf-8') if cmd_bytes else ""
-        except:
-            cmd = ""
+        except curses.error:
+            cmd_bytes = b""
         curses.noecho()
+        # replacement decode keeps the input path free of decode exceptions
+        cmd = cmd_bytes.decode('utf-8', errors='replace') if cmd_bytes else ""
+        # the prompt bypassed draw_row, so the shadow row is stale
+        self._prev[self.maxy-1] = None
         if cmd == 'w':
             self.save_file()
         elif cmd == 'q':
@@ -221,67 +521,146 @@ class Editor:
             return False
         return True
 
-    def pos2buffer(self, pos):
+    def line(self, y):
+        """Current text of line y, materializing the gap line lazily"""
+        if y == self.gap_y:
+            if self._gap_str is None:
+                self._gap_str = self.gapline.to_str()
+            return self._gap_str
+        return self.buffer[y]
+
+    def line_len(self, y):
+        """Length of line y; the width sidecar tracks it incrementally"""
+        if y == self.gap_y:
+            return len(self.gapline)
+        return len(self.widths[y])
+
+    def flush_gap(self):
+        """Write the gap line back into the buffer"""
+        if self.gapline is not None:
+            self.buffer[self.gap_y] = self.line(self.gap_y)
+            self.gapline = None
+            self.gap_y = None
+            self._gap_str = None
+
+    def gap_for(self, y, col):
+        """Get the gap line for y, flushing any gap on another line"""
+        if y != self.gap_y:
+            self.flush_gap()
+            self.gapline = GapLine(self.buffer[y], col)
+            self.gap_y = y
+        return self.gapline
+
+    def line_widths(self, line):
+        """Per-character display widths of a line"""
+        return scan_widths(line)
+
+    def cum_widths(self, widths):
+        """Prefix sums of a width array; entry p is the screen x of column p"""
+        cum = array.array('i', [0])
+        x = 0
+        for w in widths:
+            x += w
+            cum.append(x)
+        return cum
+
+    def init_width_cache(self):
+        """(Re)build the width sidecar for the whole buffer"""
+        self.widths = [self.line_widths(line) for line in self.buffer]
+        self.cum = [self.cum_widths(w) for w in self.widths]
+
+    def rebuild_cum(self, y, start=0):
+        """Recompute prefix sums for line y from the edit point forward"""
+        cum = self.cum[y]
+        del cum[start+1:]
+        x = cum[start]
+        for w in self.widths[y][start:]:
+            x += w
+            cum.append(x)
+
+    def pos2buffer(self, y, x):
         """Convert screen position to buffer position, handling wide characters"""
-        y, x = pos
-        line = self.buffer[y]
-        p = 0
-        i = 0
-        for i, c in enumerate(line):
-            if p >= x:
-                return i
-            width = 2 if ord(c) > 127 else 1  # Simple wide char detection
-            p += width
-        return i + (x - p) + 1
+        cum = self.cum[y]
+        n = len(cum) - 1
+        i = bisect.bisect_left(cum, x)
+        if i < n:
+            return i
+        return n + (x - cum[n])
 
     def buffer2x(self, y, p):
         """Convert buffer position to screen x, handling wide characters"""
-        x = 0
-        for c in self.buffer[y][:p]:
-            width = 2 if ord(c) > 127 else 1
-            x += width
-        return x
+        return self.cum[y][p]
 
-    def refresh(self):
-        # Avoid full clear to prevent flickering, only update changed lines
-        for i, line in enumerate(self.buffer):
-            if i >= self.maxy - 1:
-                break
-            # Clear the line and redraw
-            self.stdscr.move(i, 0)
-            self.stdscr.clrtoeol()
-            try:
-                self.stdscr.addstr(i, 0, line[:self.maxx-1])
-            except curses.error:
-                pass
-
-        # Status line
-        self.stdscr.move(self.maxy-1, 0)
+    def draw_row(self, i, row):
+        """Redraw a screen row only if it differs from the shadow buffer"""
+        if row == self._prev[i]:
+            return
+        self._prev[i] = row
+        self.stdscr.move(i, 0)
         self.stdscr.clrtoeol()
-        status = f"-- {self.mode.upper()} --"
-        if self.filename:
-            status += f" {self.filename}"
-        try:
-            self.stdscr.addstr(self.maxy-1, 0, status[:self.maxx-1])
-        except curses.error:
-            pass
+        # pass bytes so curses doesn't re-encode; the shadow diff means a
+        # row is encoded at most once per content change.  insstr never
+        # advances past the bottom-right corner, so unlike addstr it cannot
+        # raise on the status row and needs no exception guard
+        self.stdscr.insstr(i, 0, row.encode('utf-8'))
 
-        # Fill remaining lines with ~
-        for i in range(len(self.buffer), self.maxy-1):
-            self.stdscr.move(i, 0)
-            self.stdscr.clrtoeol()
-            try:
-                self.stdscr.addstr(i, 0, "~")
-            except curses.error:
-                pass
+    def handle_resize(self):
+        """Re-read the window size and drop every size-dependent cache.
 
-        # Cursor
-        screen_x = self.buffer2x(self.pos[0], self.pos[1])
-        try:
-            self.stdscr.move(self.pos[0], min(screen_x, self.maxx-1))
-        except curses.error:
-            pass
-        self.stdscr.refresh()
+        This is the only place dimensions change, so refresh can treat
+        maxy/maxx as constants instead of calling getmaxyx every frame.
+        """
+        self.maxy, self.maxx = self.stdscr.getmaxyx()
+        self._prev = [None] * self.maxy  # shadow rows no longer line up
+        self._status_mode = None  # status clip depends on maxx
+        self._dirty = True  # scroll_to_cursor reclamps top_line on redraw
+
+    def scroll_to_cursor(self):
+        """Clamp top_line so the cursor line stays inside the viewport"""
+        if self.y < self.top_line:
+            self.top_line = self.y
+            self._dirty = True
+        elif self.y > self.top_line + self.maxy - 2:
+            self.top_line = self.y - (self.maxy - 2)
+            self._dirty = True
+
+    def refresh(self):
+        self.scroll_to_cursor()
+        if self._sync_output:
+            curses.putp(b'\x1b[?2026h')  # begin synchronized update
+        # Diff against the shadow buffer so only changed rows hit the terminal
+        if self._dirty:
+            for i in range(self.maxy - 1):
+                y = self.top_line + i
+                if y < len(self.buffer):
+                    # clip by display columns via the prefix sums, so a wide
+                    # char is never cut in half at the right edge
+                    p = bisect.bisect_right(self.cum[y], self.maxx - 1) - 1
+                    row = self.line(y)[:p]
+                else:
+                    row = "~"
+                self.draw_row(i, row)
+            self._dirty = False
+
+        # Status line, reformatted only when the mode changes
+        if self.mode is not self._status_mode:
+            self._status_mode = self.mode
+            status = f"-- {self.mode.upper()} --"
+            if self.filename:
+                status += f" {self.filename}"
+            self._status = status[:self.maxx-1]
+        self.draw_row(self.maxy-1, self._status)
+
+        # Cursor, translated into viewport coordinates; scroll_to_cursor has
+        # already clamped the row and the column is clipped below, so this
+        # move cannot go out of bounds
+        screen_x = self.buffer2x(self.y, self.x)
+        self.stdscr.move(self.y - self.top_line, min(screen_x, self.maxx-1))
+        # Coalesce all pending writes into a single terminal update
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+        if self._sync_output:
+            curses.putp(b'\x1b[?2026l')  # end synchronized update
 
 def main():
     filename = sys.argv[1] if len(sys.argv) > 1 else None
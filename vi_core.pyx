@@ -0,0 +1,54 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled kernels for the per-keystroke numeric work in vi.py.
+
+Build in place with:
+
+    python setup.py build_ext --inplace
+
+vi.py imports these when the extension is present and falls back to the
+pure Python (or numba-JITted) versions otherwise.
+"""
+
+# Bjoern Hoehrmann's UTF-8 DFA table, identical to the one in vi.py
+_UTF8D = bytes([
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 00..1f
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 20..3f
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 40..5f
+    0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0, 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,  # 60..7f
+    1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1, 9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,  # 80..9f
+    7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7, 7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,  # a0..bf
+    8,8,2,2,2,2,2,2,2,2,2,2,2,2,2,2, 2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,  # c0..df
+    10,3,3,3,3,3,3,3,3,3,3,3,3,4,3,3, 11,6,6,6,5,8,8,8,8,8,8,8,8,8,8,8, # e0..ff
+    # transition table
+    0,12,24,36,60,96,84,12,12,12,48,72, 12,12,12,12,12,12,12,12,12,12,12,12,
+    12,0,12,12,12,12,12,0,12,0,12,12, 12,24,12,12,12,12,12,24,12,24,12,12,
+    12,12,12,12,12,12,12,24,12,12,12,12, 12,24,12,12,12,12,12,12,12,24,12,12,
+    12,12,12,12,12,12,12,36,12,36,12,12, 12,36,12,12,12,12,12,36,12,36,12,12,
+    12,36,12,12,12,12,12,12,12,12,12,12,
+])
+
+cdef const unsigned char* UTF8D = _UTF8D
+
+
+def utf8_decode(unsigned int state, unsigned int codep, unsigned int byte):
+    """Advance the UTF-8 DFA by one byte, returning (state, codepoint)"""
+    cdef unsigned int typ = UTF8D[byte]
+    if state != 0:
+        codep = (byte & 0x3f) | (codep << 6)
+    else:
+        codep = (0xff >> typ) & byte
+    return UTF8D[256 + state + typ], codep
+
+
+def scan_widths(unicode line, bytes table):
+    """Per-character display widths of a line, as a bytes object"""
+    cdef Py_ssize_t n = len(line)
+    cdef Py_ssize_t tn = len(table)
+    cdef const unsigned char* t = table
+    cdef bytearray out = bytearray(n)
+    cdef Py_ssize_t i
+    cdef Py_ssize_t c
+    for i in range(n):
+        c = <Py_ssize_t>(<Py_UCS4>line[i])
+        out[i] = t[c] if c < tn else 1
+    return bytes(out)